@@ -1,15 +1,138 @@
+import asyncio
+import hashlib
 import json
 import os
 import logging
-import re
-from openai import OpenAI
+import random
+import time
+import httpx
+import openai
+import orjson
+import tenacity
+import tiktoken
+from aiolimiter import AsyncLimiter
+from openai import AsyncOpenAI
+
+try:
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:
+    # Only available in the Lambda runtime; SnapStart hooks are skipped elsewhere
+    register_after_restore = register_before_snapshot = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Configure OpenAI client with API key from environment variable
-client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+MODEL = "gpt-5.1"
+
+# Bump whenever the analysis prompt changes so cached results are not reused
+PROMPT_VERSION = "2"
+
+# Upper bound on concurrent OpenAI requests within a single invocation
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "10"))
+
+# Synchronous batch requests must finish within the API function's timeout, so
+# longer policy_texts lists are rejected; bulk jobs go through lambda_handler_batch
+MAX_BATCH_POLICIES = int(os.environ.get("MAX_BATCH_POLICIES", "20"))
+
+# Batch requests pack up to this many policies into one OpenAI request, which
+# saves requests-per-minute quota at the cost of a longer call (capped at 8 to
+# keep each call's latency and output size bounded). 1 sends one request per
+# policy.
+POLICIES_PER_REQUEST = min(max(int(os.environ.get("POLICIES_PER_REQUEST", "1")), 1), 8)
+
+# DynamoDB table caching analyses by policy text hash (disabled when unset)
+CACHE_TABLE_NAME = os.environ.get("CACHE_TABLE_NAME")
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+
+_dynamodb = None
+_cache_table = None
+
+# DynamoDB table tracking OpenAI Batch API jobs submitted by lambda_handler_batch
+BATCH_JOBS_TABLE_NAME = os.environ.get("BATCH_JOBS_TABLE_NAME")
+
+_batch_jobs_table = None
+
+# Account rate limits; requests are paced to stay under them instead of
+# letting OpenAI reject them with 429s
+MAX_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_MAX_REQUESTS_PER_MINUTE", "500"))
+MAX_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_MAX_TOKENS_PER_MINUTE", "200000"))
+
+# Retries for transient OpenAI failures. No new attempt starts once
+# OPENAI_RETRY_DEADLINE_SECONDS have passed (including rate limiter waits), and
+# the read timeout (max wait between streamed chunks) is short enough that a
+# timed-out attempt still leaves room for a retry within the 60s Lambda timeout
+OPENAI_MAX_ATTEMPTS = int(os.environ.get("OPENAI_MAX_ATTEMPTS", "4"))
+OPENAI_RETRY_DEADLINE_SECONDS = float(os.environ.get("OPENAI_RETRY_DEADLINE_SECONDS", "30"))
+OPENAI_READ_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_READ_TIMEOUT_SECONDS", "20"))
+
+# Policies whose prompt exceeds this are rejected before calling OpenAI
+MAX_INPUT_TOKENS = int(os.environ.get("MAX_INPUT_TOKENS", "120000"))
+
+# Rough upper bound on completion tokens for one analysis (three short summaries)
+ESTIMATED_COMPLETION_TOKENS = 600
+
+request_limiter = AsyncLimiter(MAX_REQUESTS_PER_MINUTE, 60)
+token_limiter = AsyncLimiter(MAX_TOKENS_PER_MINUTE, 60)
+
+# Created lazily and reused across warm invocations
+_client = None
+_event_loop = None
+_encoding = None
+_encoding_retry_at = 0.0
+_system_prompt_tokens = None
+
+# Seconds to wait before retrying a failed tokenizer load
+ENCODING_RETRY_SECONDS = 60
+
+
+def get_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.environ['OPENAI_API_KEY'],
+            # Retries are handled by tenacity around the whole streamed call
+            max_retries=0,
+            # HTTP/2 multiplexes concurrent completions over one TLS
+            # connection that stays open between warm invocations
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=max(20, MAX_CONCURRENCY),
+                    max_keepalive_connections=max(20, MAX_CONCURRENCY),
+                    keepalive_expiry=300.0
+                ),
+                timeout=httpx.Timeout(60.0, connect=5.0, read=OPENAI_READ_TIMEOUT_SECONDS)
+            )
+        )
+    return _client
+
+
+def run_async(coro):
+    """Run a coroutine on the persistent event loop.
+
+    The async client's pooled connections are bound to the loop they were
+    opened on, so warm invocations reuse one loop instead of asyncio.run().
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop.run_until_complete(coro)
+
+
+def normalize_policy_text(text):
+    """Trim the policy and collapse whitespace runs to single spaces.
+
+    Policies pasted from web pages carry lots of indentation and blank lines;
+    collapsing them in one C-level pass cuts the tokens sent to OpenAI.
+    """
+    return " ".join(text.split())
+
+
+def is_policy_text(value):
+    """Check that a value is a string with non-whitespace content."""
+    return isinstance(value, str) and bool(value) and not value.isspace()
 
 
 def parse_request_body(event):
@@ -17,41 +140,244 @@ def parse_request_body(event):
     try:
         body = event.get('body')
         if isinstance(body, str):
-            body = json.loads(body)
+            body = orjson.loads(body)
         elif body is None:
             body = {}
         return body
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse request body: {str(e)}")
         return {}
 
 
-def get_completion_from_messages(messages, model="gpt-5.1"):
-    """Get completion from OpenAI with deterministic settings."""
-    logger.info("Messages sent to OpenAI:")
+def get_dynamodb():
+    """Return the shared DynamoDB resource, creating it on first use."""
+    global _dynamodb
+    if _dynamodb is None:
+        # Imported lazily so local runs without DynamoDB don't need boto3
+        import boto3
+        _dynamodb = boto3.resource("dynamodb")
+    return _dynamodb
+
+
+def get_cache_table():
+    """Return the DynamoDB cache table, or None if caching is disabled."""
+    global _cache_table
+    if _cache_table is None and CACHE_TABLE_NAME:
+        _cache_table = get_dynamodb().Table(CACHE_TABLE_NAME)
+    return _cache_table
+
+
+def get_batch_jobs_table():
+    """Return the DynamoDB table tracking Batch API jobs."""
+    global _batch_jobs_table
+    if _batch_jobs_table is None:
+        if not BATCH_JOBS_TABLE_NAME:
+            raise ValueError("BATCH_JOBS_TABLE_NAME is not configured")
+        _batch_jobs_table = get_dynamodb().Table(BATCH_JOBS_TABLE_NAME)
+    return _batch_jobs_table
+
+
+def cache_key(policy_text, model=MODEL, packed=False):
+    """Build the exact-match cache key for a policy text.
+
+    Analyses from packed multi-policy prompts use a different prompt, so they
+    are keyed separately and never served to single-policy requests.
+    """
+    prompt_mode = "multi" if packed else ""
+    return hashlib.sha256((model + PROMPT_VERSION + prompt_mode + policy_text).encode("utf-8")).hexdigest()
+
+
+def parse_cached_item(item):
+    """Return the analysis stored in a cache item, or None if expired or unreadable."""
+    try:
+        # DynamoDB deletes expired items lazily, so check the TTL ourselves
+        if int(item.get("expires_at", 0)) <= time.time():
+            return None
+        return orjson.loads(item["analysis"])
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache item {item.get('cache_key')}: {str(e)}")
+        return None
+
+
+def cache_item(key, analysis_result):
+    """Build the cache item storing an analysis result."""
+    return {
+        "cache_key": key,
+        "analysis": orjson.dumps(analysis_result).decode(),
+        "expires_at": int(time.time()) + CACHE_TTL_SECONDS
+    }
+
+
+def get_cached_analysis(key):
+    """Look up a cached analysis result; cache failures are treated as misses."""
+    table = get_cache_table()
+    if table is None:
+        return None
+    try:
+        item = table.get_item(Key={"cache_key": key}).get("Item")
+    except Exception as e:
+        logger.warning(f"Cache lookup failed: {str(e)}")
+        return None
+    if item is None:
+        return None
+    return parse_cached_item(item)
+
+
+def get_cached_analyses(keys):
+    """Look up several cached analyses with BatchGetItem.
+
+    Returns a dict of cache key to analysis for the hits; failures are misses.
+    """
+    table = get_cache_table()
+    if table is None or not keys:
+        return {}
+
+    hits = {}
+    unique_keys = list(dict.fromkeys(keys))
+    try:
+        # BatchGetItem reads at most 100 keys per call
+        for start in range(0, len(unique_keys), 100):
+            request = {table.name: {"Keys": [{"cache_key": key} for key in unique_keys[start:start + 100]]}}
+            # Retry keys DynamoDB left unprocessed a few times; the rest are misses
+            for _ in range(3):
+                response = get_dynamodb().batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(table.name, []):
+                    analysis_result = parse_cached_item(item)
+                    if analysis_result is not None:
+                        hits[item["cache_key"]] = analysis_result
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+    except Exception as e:
+        logger.warning(f"Cache lookup failed: {str(e)}")
+    return hits
+
+
+def put_cached_analysis(key, analysis_result):
+    """Store an analysis result in the cache; failures are logged and ignored."""
+    table = get_cache_table()
+    if table is None:
+        return
+    try:
+        table.put_item(Item=cache_item(key, analysis_result))
+    except Exception as e:
+        logger.warning(f"Cache write failed: {str(e)}")
+
+
+def put_cached_analyses(analyses):
+    """Store several analyses (cache key to analysis) with batched writes."""
+    table = get_cache_table()
+    if table is None or not analyses:
+        return
     try:
-        logger.info(json.dumps(messages, indent=2))
-    except Exception:
-        # In case of non-serializable content
-        logger.info(str(messages))
+        with table.batch_writer(overwrite_by_pkeys=["cache_key"]) as writer:
+            for key, analysis_result in analyses.items():
+                writer.put_item(Item=cache_item(key, analysis_result))
+    except Exception as e:
+        logger.warning(f"Cache write failed: {str(e)}")
 
-    response = client.chat.completions.create(
+
+def estimate_tokens(messages, expected_analyses=1):
+    """Estimate the tokens a request will consume.
+
+    The prompt is counted with the same tokenizer as the length gate; only the
+    completion size is estimated.
+    """
+    return count_messages_tokens(messages) + ESTIMATED_COMPLETION_TOKENS * expected_analyses
+
+
+def check_completion(refusal, finish_reason):
+    """Raise if a completion was refused or cut off before finishing.
+
+    Structured outputs only guarantee valid JSON for a completed answer; a
+    refusal or a truncated response would otherwise surface as a parse error.
+    """
+    if refusal:
+        raise ValueError(f"OpenAI refused to analyze the policy: {refusal}")
+    if finish_reason != "stop":
+        raise ValueError(f"OpenAI response incomplete (finish_reason: {finish_reason})")
+
+
+@tenacity.retry(
+    wait=tenacity.wait_random_exponential(min=1, max=10),
+    stop=(tenacity.stop_after_attempt(OPENAI_MAX_ATTEMPTS)
+          | tenacity.stop_before_delay(OPENAI_RETRY_DEADLINE_SECONDS)),
+    retry=tenacity.retry_if_exception_type((
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError
+    )),
+    before_sleep=tenacity.before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+async def get_completion_from_messages(messages, model=MODEL, response_format=None, expected_analyses=1):
+    """Get completion from OpenAI with deterministic settings."""
+    # Wait for a request slot and enough token budget before calling
+    await request_limiter.acquire()
+    await token_limiter.acquire(min(estimate_tokens(messages, expected_analyses), MAX_TOKENS_PER_MINUTE))
+
+    # Log one fixed-size line per call; the prompt includes the full policy
+    # text, so it is only serialized when DEBUG logging is actually enabled
+    messages_chars = sum(len(message["content"]) for message in messages)
+    logger.info(f"OpenAI call: model={model} messages={len(messages)} messages_chars={messages_chars}")
+    if logger.isEnabledFor(logging.DEBUG):
+        try:
+            logger.debug(f"Messages sent to OpenAI: {orjson.dumps(messages).decode()}")
+        except Exception:
+            # In case of non-serializable content
+            logger.debug(f"Messages sent to OpenAI: {str(messages)}")
+
+    # Stream the completion so long analyses keep data flowing instead of
+    # sitting idle until upstream proxy/gateway timeouts cut the request
+    stream = await get_client().chat.completions.create(
         model=model,
         messages=messages,
         temperature=0,   # deterministic / less “creative”
         top_p=1,
         seed=42,
+        response_format=response_format or RESPONSE_FORMAT,
+        stream=True,
+        stream_options={"include_usage": True},
     )
-    logger.info(f"OpenAI raw response: {response.model_dump_json(indent=2)}")
-    return response.choices[0].message.content
 
+    parts = []
+    refusal_parts = []
+    finish_reason = None
+    usage = None
+    async with stream:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                parts.append(delta.content)
+            if getattr(delta, "refusal", None):
+                refusal_parts.append(delta.refusal)
+            if chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
 
-def create_analysis_prompt(policy_text: str):
-    """Create system message and user message for privacy policy analysis."""
-    delimiter = "####"
+    logger.info(
+        f"OpenAI response: tokens_in={usage.prompt_tokens if usage else None} "
+        f"tokens_out={usage.completion_tokens if usage else None} finish_reason={finish_reason}"
+    )
+    openai_response = "".join(parts)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"OpenAI raw response content: {openai_response}")
 
-    system_message = f"""
-    You will be given privacy policy text inside {delimiter} characters.
+    check_completion("".join(refusal_parts), finish_reason)
+    return openai_response
+
+
+DELIMITER = "####"
+
+# The system message is constant, so build it once at import time. Sending the
+# identical prefix on every request also lets OpenAI's prompt cache reuse it.
+SYSTEM_MESSAGE = """
+    You will be given privacy policy text inside #### characters.
 
     Analyze ONLY the text inside the delimiters.
     If something is not directly stated, output: "Not specified".
@@ -101,21 +427,21 @@ def create_analysis_prompt(policy_text: str):
 
     Your output MUST be a single valid JSON object with this structure:
 
-    {{
-        "data_collecting": {{
+    {
+        "data_collecting": {
             "details": "Very short summary (max 100 words) of the types of data explicitly collected. If none stated, write 'Not specified'.",
             "severity": "Low" or "Medium" or "High"
-        }},
-        "data_sharing": {{
+        },
+        "data_sharing": {
             "details": "Very short summary (max 100 words) of who the data is shared with, based ONLY on what is explicitly written. If not stated, write 'Not specified'.",
             "severity": "Low" or "Medium" or "High"
-        }},
-        "data_retention": {{
+        },
+        "data_retention": {
             "details": "State ONLY the retention period explicitly written in the text. If vague, write 'varies'. If no numeric duration is provided, write 'Not specified'. Max 100 words.",
             "severity": "Low" or "Medium" or "High"
-        }},
+        },
         "overall_privacy_risk": "Low" or "Medium" or "High"
-    }}
+    }
 
     STRICT RULES:
     - Each 'details' field MUST NOT exceed 100 words.
@@ -123,14 +449,367 @@ def create_analysis_prompt(policy_text: str):
     - Apply the conservative rules above; default to MEDIUM when in doubt.
     """
 
-    user_message = f"{delimiter}{policy_text}{delimiter}"
+SYSTEM_MESSAGE_DICT = {"role": "system", "content": SYSTEM_MESSAGE}
+
+SEVERITY_SCHEMA = {"type": "string", "enum": ["Low", "Medium", "High"]}
+
+CATEGORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "details": {"type": "string"},
+        "severity": SEVERITY_SCHEMA
+    },
+    "required": ["details", "severity"],
+    "additionalProperties": False
+}
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "data_collecting": CATEGORY_SCHEMA,
+        "data_sharing": CATEGORY_SCHEMA,
+        "data_retention": CATEGORY_SCHEMA,
+        "overall_privacy_risk": SEVERITY_SCHEMA
+    },
+    "required": ["data_collecting", "data_sharing", "data_retention", "overall_privacy_risk"],
+    "additionalProperties": False
+}
+
+# Structured outputs make OpenAI return JSON matching ANALYSIS_SCHEMA
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "privacy_policy_analysis",
+        "strict": True,
+        "schema": ANALYSIS_SCHEMA
+    }
+}
+
+MULTI_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "privacy_policy_analyses",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "analyses": {"type": "array", "items": ANALYSIS_SCHEMA}
+            },
+            "required": ["analyses"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Appended after SYSTEM_MESSAGE so multi-policy requests share its prefix
+MULTI_ANALYSIS_MESSAGE = """
+    You will now be given several privacy policy texts instead of one. Each
+    policy is inside #### characters and policies are separated by a line
+    containing only ---.
+
+    Analyze each policy independently with the rules above, as if it were the
+    only text provided. Output a single JSON object with an "analyses" array
+    holding one analysis object per policy, in the same order as the policies.
+    """
+
+MULTI_ANALYSIS_MESSAGE_DICT = {"role": "system", "content": MULTI_ANALYSIS_MESSAGE}
+
+
+def create_analysis_prompt(policy_text: str):
+    """Create system message and user message for privacy policy analysis."""
+    return [
+        SYSTEM_MESSAGE_DICT,
+        {"role": "user", "content": f"{DELIMITER}{policy_text}{DELIMITER}"}
+    ]
+
 
+def create_multi_analysis_prompt(policy_texts):
+    """Create messages asking for one analysis per policy in a single request."""
+    user_message = "\n---\n".join(f"{DELIMITER}{text}{DELIMITER}" for text in policy_texts)
     return [
-        {"role": "system", "content": system_message},
+        SYSTEM_MESSAGE_DICT,
+        MULTI_ANALYSIS_MESSAGE_DICT,
         {"role": "user", "content": user_message}
     ]
 
 
+def get_encoding():
+    """Return the o200k_base tokenizer, or None if it cannot be loaded right now.
+
+    The deployment package bundles the encoding file and TIKTOKEN_CACHE_DIR
+    points at it, so loading doesn't touch the network. A failed load is
+    retried after ENCODING_RETRY_SECONDS rather than on every call.
+    """
+    global _encoding, _encoding_retry_at
+    if _encoding is None and time.monotonic() >= _encoding_retry_at:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer, estimating tokens from length: {str(e)}")
+            _encoding_retry_at = time.monotonic() + ENCODING_RETRY_SECONDS
+    return _encoding
+
+
+def count_tokens(text):
+    """Count tokens with the o200k_base encoding used by current OpenAI models."""
+    encoding = get_encoding()
+    if encoding is None:
+        # Never fail an analysis because the tokenizer is unavailable
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_messages_tokens(messages):
+    """Count the tokens of all message contents in a prompt."""
+    return sum(count_tokens(message["content"]) for message in messages)
+
+
+def count_system_prompt_tokens():
+    """Count the tokens the analysis prompt adds around a policy text."""
+    global _system_prompt_tokens
+    if _system_prompt_tokens is not None:
+        return _system_prompt_tokens
+    system_prompt_tokens = count_tokens(SYSTEM_MESSAGE) + 2 * count_tokens(DELIMITER)
+    # Only keep an exact count, not the estimate used while the tokenizer is unavailable
+    if _encoding is not None:
+        _system_prompt_tokens = system_prompt_tokens
+    return system_prompt_tokens
+
+
+def count_prompt_tokens(policy_text):
+    """Count the input tokens of the analysis prompt for a policy text."""
+    return count_system_prompt_tokens() + count_tokens(policy_text)
+
+
+def prompt_length_error(prompt_tokens):
+    """Return an error message if a prompt is too long to send, else None."""
+    if prompt_tokens > MAX_INPUT_TOKENS:
+        return f"Policy text too long: {prompt_tokens} tokens (max {MAX_INPUT_TOKENS})"
+    return None
+
+
+def check_policy_length(policy_text):
+    """Return an error message if the policy is too long to analyze, else None."""
+    return prompt_length_error(count_prompt_tokens(policy_text))
+
+
+def group_policies(policy_texts, policy_tokens):
+    """Split policies into groups to pack into one request each.
+
+    Groups hold at most POLICIES_PER_REQUEST policies and are closed early
+    when the packed prompt would exceed MAX_INPUT_TOKENS.
+    """
+    base_tokens = count_tokens(SYSTEM_MESSAGE) + count_tokens(MULTI_ANALYSIS_MESSAGE)
+    # Delimiters and the separator line added around each packed policy
+    policy_overhead = count_tokens(f"{DELIMITER}{DELIMITER}\n---\n")
+
+    groups = []
+    group = []
+    group_tokens = base_tokens
+    for policy_text, tokens in zip(policy_texts, policy_tokens):
+        tokens += policy_overhead
+        if group and (len(group) >= POLICIES_PER_REQUEST or group_tokens + tokens > MAX_INPUT_TOKENS):
+            groups.append(group)
+            group = []
+            group_tokens = base_tokens
+        group.append(policy_text)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+def parse_analysis_response(openai_response):
+    """Parse the analysis JSON of a completed OpenAI response (shaped by RESPONSE_FORMAT)."""
+    return orjson.loads(openai_response)
+
+
+def summarize_category(analysis_result, category):
+    """Extract the details and severity of one analysis category."""
+    result = analysis_result.get(category) or {}
+    return {
+        "details": result.get("details", "Not specified"),
+        "severity": result.get("severity", "Unknown")
+    }
+
+
+def build_summary(analysis_result):
+    """Structure the parsed analysis into the API response summary."""
+    return {
+        "data_collecting": summarize_category(analysis_result, "data_collecting"),
+        "data_sharing": summarize_category(analysis_result, "data_sharing"),
+        "data_retention": summarize_category(analysis_result, "data_retention"),
+        "overall_privacy_risk": analysis_result.get("overall_privacy_risk", "Unknown")
+    }
+
+
+async def _analyze_group(semaphore, policy_texts, model=MODEL):
+    """Analyze a group of policy texts with one OpenAI request and parse the results.
+
+    Returns an (analysis, packed) pair per policy text, where packed tells
+    whether the analysis came from a multi-policy prompt.
+    """
+    if len(policy_texts) == 1:
+        async with semaphore:
+            openai_response = await get_completion_from_messages(
+                create_analysis_prompt(policy_texts[0]),
+                model=model
+            )
+        return [(parse_analysis_response(openai_response), False)]
+
+    messages = create_multi_analysis_prompt(policy_texts)
+    prompt_tokens = count_messages_tokens(messages)
+    if prompt_length_error(prompt_tokens):
+        # group_policies sizes groups from per-policy counts; if the packed
+        # prompt still comes out too long, send each policy on its own
+        logger.warning(f"Packed prompt of {prompt_tokens} tokens exceeds {MAX_INPUT_TOKENS}, "
+                       f"analyzing {len(policy_texts)} policies separately")
+        group_results = await asyncio.gather(
+            *[_analyze_group(semaphore, [policy_text], model=model) for policy_text in policy_texts]
+        )
+        return [outcome for group_result in group_results for outcome in group_result]
+
+    async with semaphore:
+        openai_response = await get_completion_from_messages(
+            messages,
+            model=model,
+            response_format=MULTI_RESPONSE_FORMAT,
+            expected_analyses=len(policy_texts)
+        )
+    analyses = parse_analysis_response(openai_response)["analyses"]
+    if len(analyses) != len(policy_texts):
+        raise ValueError(f"Expected {len(policy_texts)} analyses from OpenAI, got {len(analyses)}")
+    return [(analysis, True) for analysis in analyses]
+
+
+async def analyze_policies_grouped(policy_texts, model=MODEL, policy_tokens=None):
+    """Analyze policy texts concurrently, up to POLICIES_PER_REQUEST per OpenAI request.
+
+    policy_tokens optionally gives the token count of each policy text, used
+    to keep packed prompts within MAX_INPUT_TOKENS.
+
+    Returns an (outcome, packed) pair per policy text: the parsed analysis or
+    the exception that prevented it, and whether it came from a packed prompt.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    if POLICIES_PER_REQUEST == 1 or len(policy_texts) == 1:
+        groups = [[policy_text] for policy_text in policy_texts]
+    else:
+        if policy_tokens is None:
+            policy_tokens = [count_tokens(policy_text) for policy_text in policy_texts]
+        groups = group_policies(policy_texts, policy_tokens)
+    group_results = await asyncio.gather(
+        *[_analyze_group(semaphore, group, model=model) for group in groups],
+        return_exceptions=True
+    )
+
+    outcomes = []
+    for group, group_result in zip(groups, group_results):
+        if isinstance(group_result, Exception):
+            outcomes.extend([(group_result, len(group) > 1)] * len(group))
+        else:
+            outcomes.extend(group_result)
+    return outcomes
+
+
+def analyze_policy(policy_text, model=MODEL):
+    """Analyze a single policy text and return the parsed analysis."""
+    analysis_result, _ = run_async(analyze_policies_grouped([policy_text], model=model))[0]
+    if isinstance(analysis_result, Exception):
+        raise analysis_result
+    return analysis_result
+
+
+def handle_batch_request(policy_texts, cors_headers):
+    """Analyze a list of policy texts in one invocation."""
+    if not policy_texts or not all(is_policy_text(t) for t in policy_texts):
+        logger.warning("Invalid policy_texts provided in request")
+        return {
+            "statusCode": 400,
+            "headers": cors_headers,
+            "body": orjson.dumps({
+                "message": "policy_texts must be a non-empty list of non-empty strings",
+                "status": "error"
+            }).decode()
+        }
+
+    if len(policy_texts) > MAX_BATCH_POLICIES:
+        logger.warning(f"Too many policy_texts in request: {len(policy_texts)}")
+        return {
+            "statusCode": 400,
+            "headers": cors_headers,
+            "body": orjson.dumps({
+                "message": f"policy_texts may contain at most {MAX_BATCH_POLICIES} policies; "
+                           "submit larger jobs through the Batch API (lambda_handler_batch)",
+                "status": "error"
+            }).decode()
+        }
+
+    policy_texts = [normalize_policy_text(t) for t in policy_texts]
+    keys = [cache_key(t) for t in policy_texts]
+    packed_keys = [cache_key(t, packed=True) for t in policy_texts]
+    results = [None] * len(policy_texts)
+
+    # Serve cached analyses first and only send the misses to OpenAI. Results
+    # of packed prompts are only reused when this request may pack as well.
+    if POLICIES_PER_REQUEST > 1:
+        cached = get_cached_analyses(keys + packed_keys)
+    else:
+        cached = get_cached_analyses(keys)
+    misses = []
+    miss_tokens = []
+    for index, key in enumerate(keys):
+        analysis_result = cached.get(key) or cached.get(packed_keys[index])
+        if analysis_result is not None:
+            results[index] = {"status": "success", "summary": build_summary(analysis_result)}
+            continue
+
+        policy_tokens = count_tokens(policy_texts[index])
+        length_error = prompt_length_error(count_system_prompt_tokens() + policy_tokens)
+        if length_error:
+            logger.warning(f"Skipping policy {index}: {length_error}")
+            results[index] = {"status": "error", "error": length_error}
+        else:
+            misses.append(index)
+            miss_tokens.append(policy_tokens)
+
+    logger.info(f"Analyzing {len(misses)} of {len(policy_texts)} policy texts "
+                f"(max concurrency: {MAX_CONCURRENCY}, "
+                f"policies per request: {POLICIES_PER_REQUEST})")
+    outcomes = []
+    if misses:
+        outcomes = run_async(analyze_policies_grouped(
+            [policy_texts[index] for index in misses],
+            model=MODEL,
+            policy_tokens=miss_tokens
+        ))
+
+    new_analyses = {}
+    for index, (outcome, packed) in zip(misses, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error analyzing policy {index}: {str(outcome)}")
+            results[index] = {
+                "status": "error",
+                "error": str(outcome)
+            }
+            continue
+
+        new_analyses[packed_keys[index] if packed else keys[index]] = outcome
+        results[index] = {
+            "status": "success",
+            "summary": build_summary(outcome)
+        }
+    put_cached_analyses(new_analyses)
+
+    return {
+        "statusCode": 200,
+        "headers": cors_headers,
+        "body": orjson.dumps({
+            "status": "success",
+            "results": results
+        }).decode()
+    }
+
 
 def lambda_handler(event, context):
     """
@@ -172,70 +851,65 @@ def lambda_handler(event, context):
     try:
         # Parse request body
         body = parse_request_body(event)
-        policy_text = (body.get("policy_text") or "").strip()
+
+        # Batch path: analyze several policies concurrently
+        if isinstance(body.get("policy_texts"), list):
+            response = handle_batch_request(body["policy_texts"], cors_headers)
+            logger.info(f"Returning response with status code: {response['statusCode']}")
+            return response
+
+        policy_text = normalize_policy_text(body.get("policy_text") or "")
 
         if not policy_text:
             logger.warning("No policy text provided in request")
             return {
                 "statusCode": 400,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "message": "Missing required field: policy_text",
                     "status": "error"
-                })
+                }).decode()
             }
 
         logger.info(f"Analyzing policy text (length: {len(policy_text)} characters)")
 
-        # Create messages using the new prompt
-        messages = create_analysis_prompt(policy_text)
+        key = cache_key(policy_text)
+        analysis_result = get_cached_analysis(key)
 
-        # Call OpenAI API
-        logger.info("Starting OpenAI API call")
-        openai_response = get_completion_from_messages(
-            messages=messages,
-            model="gpt-5.1"
-        )
+        if analysis_result is not None:
+            logger.info("Cache hit, skipping OpenAI API call")
+        else:
+            # Reject policies that cannot fit the context window before
+            # paying for a round-trip that is bound to fail
+            length_error = check_policy_length(policy_text)
+            if length_error:
+                logger.warning(length_error)
+                return {
+                    "statusCode": 413,
+                    "headers": cors_headers,
+                    "body": orjson.dumps({
+                        "message": length_error,
+                        "status": "error"
+                    }).decode()
+                }
 
-        logger.info("OpenAI API call successful")
-        logger.info(f"OpenAI raw response content: {openai_response}")
+            # Call OpenAI API
+            logger.info("Starting OpenAI API call")
+            analysis_result = analyze_policy(policy_text, model=MODEL)
 
-        # Parse the JSON response
-        try:
-            analysis_result = json.loads(openai_response)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
-            # Try to extract JSON from response if it's wrapped in text
-            json_match = re.search(r'\{.*\}', openai_response, re.DOTALL)
-            if json_match:
-                analysis_result = json.loads(json_match.group())
-            else:
-                raise ValueError("OpenAI response is not valid JSON")
+            logger.info("OpenAI API call successful")
+            put_cached_analysis(key, analysis_result)
 
         # Structure the response
         response_body = {
             "status": "success",
-            "summary": {
-                "data_collecting": {
-                    "details": analysis_result.get("data_collecting", {}).get("details", "Not specified"),
-                    "severity": analysis_result.get("data_collecting", {}).get("severity", "Unknown")
-                },
-                "data_sharing": {
-                    "details": analysis_result.get("data_sharing", {}).get("details", "Not specified"),
-                    "severity": analysis_result.get("data_sharing", {}).get("severity", "Unknown")
-                },
-                "data_retention": {
-                    "details": analysis_result.get("data_retention", {}).get("details", "Not specified"),
-                    "severity": analysis_result.get("data_retention", {}).get("severity", "Unknown")
-                },
-                "overall_privacy_risk": analysis_result.get("overall_privacy_risk", "Unknown")
-            }
+            "summary": build_summary(analysis_result)
         }
 
         response = {
             "statusCode": 200,
             "headers": cors_headers,
-            "body": json.dumps(response_body)
+            "body": orjson.dumps(response_body).decode()
         }
 
         logger.info("Response prepared successfully")
@@ -247,12 +921,254 @@ def lambda_handler(event, context):
         response = {
             "statusCode": 500,
             "headers": cors_headers,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "message": "Error analyzing privacy policy",
                 "error": str(e),
                 "status": "error"
-            })
+            }).decode()
         }
 
     logger.info(f"Returning response with status code: {response['statusCode']}")
     return response
+
+
+def create_batch_input(policy_texts, model=MODEL):
+    """Build the Batch API JSONL input, one chat completion request per policy.
+
+    Each custom_id is "<index>:<cache key>" so results can be put back in
+    order and written to the analysis cache.
+    """
+    lines = []
+    for index, policy_text in enumerate(policy_texts):
+        lines.append(orjson.dumps({
+            "custom_id": f"{index}:{cache_key(policy_text, model=model)}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": create_analysis_prompt(policy_text),
+                "temperature": 0,
+                "top_p": 1,
+                "seed": 42,
+                "response_format": RESPONSE_FORMAT
+            }
+        }))
+    return b"\n".join(lines)
+
+
+async def submit_batch(policy_texts, model=MODEL):
+    """Upload the batch input file and create an OpenAI Batch API job."""
+    client = get_client()
+    input_file = await client.files.create(
+        file=("policy-analysis-batch.jsonl", create_batch_input(policy_texts, model=model)),
+        purpose="batch"
+    )
+    return await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+
+# Batch API statuses after which no more results will be produced
+BATCH_FINISHED_STATUSES = {"completed", "expired", "cancelled", "failed"}
+
+
+async def fetch_batch(batch_id):
+    """Retrieve a Batch API job and, once it has finished, its result files.
+
+    Successful requests are written to the output file and failed ones to
+    the error file; expired or cancelled batches can still have both.
+    Returns the batch and the list of downloaded file contents.
+    """
+    client = get_client()
+    batch = await client.batches.retrieve(batch_id)
+    outputs = []
+    if batch.status in BATCH_FINISHED_STATUSES:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                outputs.append((await client.files.content(file_id)).text)
+    return batch, outputs
+
+
+def parse_batch_output(outputs, policy_count, batch_status):
+    """Turn Batch API output and error lines into per-policy results, in submission order."""
+    missing = {"status": "error", "error": f"No result returned for policy (batch {batch_status})"}
+    results = [missing] * policy_count
+    new_analyses = {}
+    for line in "\n".join(outputs).splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        index, key = record["custom_id"].split(":", 1)
+        try:
+            if record.get("error"):
+                raise ValueError(record["error"].get("message", "Batch request failed"))
+            response = record["response"]
+            if response["status_code"] != 200:
+                error = (response.get("body") or {}).get("error") or {}
+                raise ValueError(f"OpenAI returned status {response['status_code']}"
+                                 + (f": {error['message']}" if error.get("message") else ""))
+            choice = response["body"]["choices"][0]
+            check_completion(choice["message"].get("refusal"), choice.get("finish_reason"))
+            analysis_result = parse_analysis_response(choice["message"]["content"])
+            new_analyses[key] = analysis_result
+            results[int(index)] = {
+                "status": "success",
+                "summary": build_summary(analysis_result)
+            }
+        except Exception as e:
+            logger.error(f"Error in batch result {index}: {str(e)}")
+            results[int(index)] = {
+                "status": "error",
+                "error": str(e)
+            }
+    put_cached_analyses(new_analyses)
+    return results
+
+
+def lambda_handler_batch(event, context):
+    """
+    Lambda handler that submits policies to the OpenAI Batch API.
+
+    Intended for non-interactive bulk analysis: the Batch API has its own
+    quota and lower token pricing, but results can take up to 24 hours.
+    Poll for them with lambda_handler_batch_status.
+
+    Args:
+        event: Direct invocation payload (or API Gateway event) with policy_texts
+        context: Lambda context
+
+    Returns:
+        dict: Submitted batch ID and job status
+    """
+    logger.info("Batch submit function invoked")
+    body = parse_request_body(event) if "body" in event else event
+    policy_texts = body.get("policy_texts")
+
+    if not isinstance(policy_texts, list) or not policy_texts or \
+            not all(is_policy_text(t) for t in policy_texts):
+        logger.warning("Invalid policy_texts provided in batch request")
+        return {
+            "status": "error",
+            "message": "policy_texts must be a non-empty list of non-empty strings"
+        }
+
+    policy_texts = [normalize_policy_text(t) for t in policy_texts]
+    too_long = [index for index, text in enumerate(policy_texts) if check_policy_length(text)]
+    if too_long:
+        logger.warning(f"Policies too long for batch: {too_long}")
+        return {
+            "status": "error",
+            "message": f"Policy texts exceed {MAX_INPUT_TOKENS} tokens",
+            "indices": too_long
+        }
+
+    try:
+        batch = run_async(submit_batch(policy_texts, model=MODEL))
+        get_batch_jobs_table().put_item(Item={
+            "batch_id": batch.id,
+            "status": batch.status,
+            "input_file_id": batch.input_file_id,
+            "policy_count": len(policy_texts),
+            "model": MODEL,
+            "created_at": int(time.time())
+        })
+    except Exception as e:
+        logger.error(f"Error submitting batch: {str(e)}", exc_info=True)
+        return {
+            "status": "error",
+            "message": "Error submitting batch",
+            "error": str(e)
+        }
+
+    logger.info(f"Submitted batch {batch.id} with {len(policy_texts)} policies")
+    return {
+        "status": "success",
+        "batch_id": batch.id,
+        "batch_status": batch.status,
+        "policy_count": len(policy_texts)
+    }
+
+
+def lambda_handler_batch_status(event, context):
+    """
+    Lambda handler that polls an OpenAI Batch API job and returns its results.
+
+    Args:
+        event: Direct invocation payload (or API Gateway event) with batch_id
+        context: Lambda context
+
+    Returns:
+        dict: Job status, plus per-policy results once the batch has completed
+    """
+    logger.info("Batch status function invoked")
+    body = parse_request_body(event) if "body" in event else event
+    batch_id = body.get("batch_id")
+
+    if not batch_id:
+        logger.warning("No batch_id provided in request")
+        return {
+            "status": "error",
+            "message": "Missing required field: batch_id"
+        }
+
+    try:
+        table = get_batch_jobs_table()
+        job = table.get_item(Key={"batch_id": batch_id}).get("Item")
+        if job is None:
+            return {
+                "status": "error",
+                "message": f"Unknown batch_id: {batch_id}"
+            }
+
+        batch, outputs = run_async(fetch_batch(batch_id))
+        table.update_item(
+            Key={"batch_id": batch_id},
+            UpdateExpression="SET #status = :status, updated_at = :updated_at",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":status": batch.status, ":updated_at": int(time.time())}
+        )
+
+        response = {
+            "status": "success",
+            "batch_id": batch_id,
+            "batch_status": batch.status
+        }
+        if batch.status in BATCH_FINISHED_STATUSES:
+            response["results"] = parse_batch_output(outputs, int(job["policy_count"]), batch.status)
+    except Exception as e:
+        logger.error(f"Error fetching batch {batch_id}: {str(e)}", exc_info=True)
+        return {
+            "status": "error",
+            "message": "Error fetching batch",
+            "error": str(e)
+        }
+
+    logger.info(f"Batch {batch_id} status: {batch.status}")
+    return response
+
+
+def prepare_snapshot():
+    """Do one-time initialization before SnapStart snapshots the function.
+
+    No connections are opened here: sockets captured in a snapshot are not
+    guaranteed to be usable after restore.
+    """
+    get_client()
+    # Fail the publish rather than snapshot an instance without a tokenizer,
+    # which every restored instance would then share
+    if get_encoding() is None:
+        raise RuntimeError("Tokenizer could not be loaded from TIKTOKEN_CACHE_DIR; not taking snapshot")
+    # Caches the system prompt token count
+    count_system_prompt_tokens()
+
+
+def restore_snapshot():
+    """Re-seed randomness so restored instances don't share retry jitter."""
+    random.seed()
+
+
+if register_before_snapshot is not None:
+    register_before_snapshot(prepare_snapshot)
+    register_after_restore(restore_snapshot)
@@ -17,7 +17,7 @@ resource "aws_apigatewayv2_integration" "lambda" {
   api_id           = aws_apigatewayv2_api.main.id
   integration_type = "AWS_PROXY"
 
-  integration_uri    = aws_lambda_function.policy_analyzer.invoke_arn
+  integration_uri    = aws_lambda_alias.policy_analyzer_live.invoke_arn
   integration_method = "POST"
 }
 
@@ -40,6 +40,7 @@ resource "aws_lambda_permission" "api_gateway" {
   statement_id  = "AllowExecutionFromAPIGateway"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.policy_analyzer.function_name
+  qualifier     = aws_lambda_alias.policy_analyzer_live.name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
 }
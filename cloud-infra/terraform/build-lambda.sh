@@ -23,6 +23,14 @@ python3 -m pip install \
   -r requirements.txt \
   --upgrade --no-cache-dir
 
+# Bundle the tiktoken encoding so the function never downloads it at runtime.
+# tiktoken looks it up in TIKTOKEN_CACHE_DIR under the SHA-1 of its URL.
+echo "Bundling tiktoken encoding..."
+TIKTOKEN_URL="https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+TIKTOKEN_CACHE_KEY="$(python3 -c 'import hashlib,sys; print(hashlib.sha1(sys.argv[1].encode()).hexdigest())' "$TIKTOKEN_URL")"
+mkdir -p package/tiktoken_cache
+curl -sSfL "$TIKTOKEN_URL" -o "package/tiktoken_cache/$TIKTOKEN_CACHE_KEY"
+
 cp lambda_function.py package/
 echo "Creating zip file..."
 cd package
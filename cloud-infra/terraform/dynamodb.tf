@@ -0,0 +1,28 @@
+# DynamoDB table caching analyses by policy text hash
+resource "aws_dynamodb_table" "policy_cache" {
+  name         = "${var.project_name}-policy-cache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# DynamoDB table tracking OpenAI Batch API jobs
+resource "aws_dynamodb_table" "batch_jobs" {
+  name         = "${var.project_name}-batch-jobs"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "batch_id"
+
+  attribute {
+    name = "batch_id"
+    type = "S"
+  }
+}
@@ -22,6 +22,49 @@ resource "aws_iam_role_policy_attachment" "lambda_basic" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# IAM policy allowing Lambda to read and write the analysis cache
+resource "aws_iam_role_policy" "lambda_policy_cache" {
+  name = "${var.project_name}-lambda-policy-cache"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem"
+        ]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.policy_cache.arn
+      }
+    ]
+  })
+}
+
+# IAM policy allowing Lambda to track Batch API jobs
+resource "aws_iam_role_policy" "lambda_batch_jobs" {
+  name = "${var.project_name}-lambda-batch-jobs"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem"
+        ]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.batch_jobs.arn
+      }
+    ]
+  })
+}
+
 # Lambda function
 # Note: Run ./build-lambda.sh before terraform plan/apply to create the package
 resource "aws_lambda_function" "policy_analyzer" {
@@ -32,12 +75,68 @@ resource "aws_lambda_function" "policy_analyzer" {
   source_code_hash = filebase64sha256("${path.module}/lambda_function.zip")
   runtime          = var.lambda_runtime
   timeout          = 60  # 1 minute
+  publish          = true
+
+  # Restore published versions from a post-init snapshot so cold starts skip
+  # importing openai/httpx and building the client (requires python3.12+)
+  snap_start {
+    apply_on = "PublishedVersions"
+  }
 
   environment {
     variables = {
       PROJECT_NAME = var.project_name
       OPENAI_API_KEY = var.openai_api_key
+      TIKTOKEN_CACHE_DIR = "/var/task/tiktoken_cache"
+      CACHE_TABLE_NAME = aws_dynamodb_table.policy_cache.name
     }
   }
 }
 
+# Alias pointing at the latest published (SnapStart-enabled) version
+resource "aws_lambda_alias" "policy_analyzer_live" {
+  name             = "live"
+  function_name    = aws_lambda_function.policy_analyzer.function_name
+  function_version = aws_lambda_function.policy_analyzer.version
+}
+
+# Batch submit function: sends policies to the OpenAI Batch API (invoked directly)
+resource "aws_lambda_function" "policy_analyzer_batch" {
+  filename         = "${path.module}/lambda_function.zip"
+  function_name    = "${var.project_name}-batch-lambda"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "lambda_function.lambda_handler_batch"
+  source_code_hash = filebase64sha256("${path.module}/lambda_function.zip")
+  runtime          = var.lambda_runtime
+  timeout          = 300  # 5 minutes, uploading large batch files
+
+  environment {
+    variables = {
+      PROJECT_NAME = var.project_name
+      OPENAI_API_KEY = var.openai_api_key
+      TIKTOKEN_CACHE_DIR = "/var/task/tiktoken_cache"
+      BATCH_JOBS_TABLE_NAME = aws_dynamodb_table.batch_jobs.name
+    }
+  }
+}
+
+# Batch status function: polls a Batch API job and returns its results (invoked directly)
+resource "aws_lambda_function" "policy_analyzer_batch_status" {
+  filename         = "${path.module}/lambda_function.zip"
+  function_name    = "${var.project_name}-batch-status-lambda"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "lambda_function.lambda_handler_batch_status"
+  source_code_hash = filebase64sha256("${path.module}/lambda_function.zip")
+  runtime          = var.lambda_runtime
+  timeout          = 300  # 5 minutes, downloading large batch output files
+
+  environment {
+    variables = {
+      PROJECT_NAME = var.project_name
+      OPENAI_API_KEY = var.openai_api_key
+      TIKTOKEN_CACHE_DIR = "/var/task/tiktoken_cache"
+      CACHE_TABLE_NAME = aws_dynamodb_table.policy_cache.name
+      BATCH_JOBS_TABLE_NAME = aws_dynamodb_table.batch_jobs.name
+    }
+  }
+}
@@ -13,3 +13,18 @@ output "lambda_function_arn" {
   value       = aws_lambda_function.policy_analyzer.arn
 }
 
+
+output "policy_cache_table_name" {
+  description = "Name of the DynamoDB analysis cache table"
+  value       = aws_dynamodb_table.policy_cache.name
+}
+
+output "batch_lambda_function_name" {
+  description = "Name of the Batch API submit Lambda function"
+  value       = aws_lambda_function.policy_analyzer_batch.function_name
+}
+
+output "batch_status_lambda_function_name" {
+  description = "Name of the Batch API status Lambda function"
+  value       = aws_lambda_function.policy_analyzer_batch_status.function_name
+}